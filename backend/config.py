@@ -3,4 +3,8 @@ import os
 # Path configuration
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODEL_PATH = os.path.join(BASE_DIR, "models", "svd_model.pkl")
-METADATA_PATH = os.path.join(BASE_DIR, "data", "myanilist.csv")
\ No newline at end of file
+METADATA_PATH = os.path.join(BASE_DIR, "data", "myanilist.csv")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+
+# Bump when build_metadata changes what it stores, to invalidate old caches
+METADATA_CACHE_VERSION = 7
@@ -1,36 +1,114 @@
 import pandas as pd
+import pyarrow.csv as pa_csv
+import numpy as np
 import joblib
 import os
-from config import MODEL_PATH, METADATA_PATH
+import tempfile
+import threading
+from functools import cached_property
+from config import MODEL_PATH, METADATA_PATH, CACHE_DIR, METADATA_CACHE_VERSION
 from services.content_based_service import build_tfidf_index
+from services.search_service import build_substring_index
+from utils.title_normalizer import normalize_title
+from utils.ranking import unit_rows
 
 def load_svd_model():
     """Load SVD model from disk."""
     objects = {}
     
     if os.path.exists(MODEL_PATH):
-        model_data = joblib.load(MODEL_PATH)
-        objects['model'] = model_data['model']
+        model_data = joblib.load(MODEL_PATH, mmap_mode='r')
         objects['anime_id_to_idx'] = model_data['anime_id_to_idx']
         objects['idx_to_anime_id'] = model_data['idx_to_anime_id']
-        objects['item_vectors'] = model_data['model'].components_.T
+        if 'item_vectors_unit' in model_data:
+            # Saved normalized and contiguous: served straight from the memory-mapped
+            # file, so forked workers share one copy through the page cache
+            objects['item_vectors_unit'] = np.asarray(model_data['item_vectors_unit'])
+        else:
+            # Older model files store raw item vectors (or the whole TruncatedSVD
+            # estimator); normalize them into a private copy
+            if 'item_vectors' in model_data:
+                item_vectors = model_data['item_vectors']
+            else:
+                item_vectors = model_data['model'].components_.T
+            objects['item_vectors_unit'] = unit_rows(item_vectors)
         print("SVD model loaded successfully")
     else:
         print(f"Error: Model not found at {MODEL_PATH}")
     
     return objects
 
+def metadata_cache_path():
+    """Cache file for the built metadata, keyed by the CSV's mtime and size."""
+    stat = os.stat(METADATA_PATH)
+    cache_key = f"v{METADATA_CACHE_VERSION}_{stat.st_mtime_ns}_{stat.st_size}"
+    return os.path.join(CACHE_DIR, f"metadata_{cache_key}.joblib")
+
 def load_metadata():
-    """Load and index metadata."""
-    objects = {}
-    
+    """Load indexed metadata, reusing the on-disk cache when the CSV is unchanged."""
     if not os.path.exists(METADATA_PATH):
         raise FileNotFoundError(f"Metadata not found at {METADATA_PATH}")
     
-    meta_df = pd.read_csv(METADATA_PATH, usecols=['ID', 'Title_Romaji', 'Title_English', 'Genres'])
+    cache_path = metadata_cache_path()
+    if os.path.exists(cache_path):
+        try:
+            objects = joblib.load(cache_path, mmap_mode='r')
+            print(f"Metadata loaded from cache {cache_path}")
+            return objects
+        except Exception as e:
+            # Unreadable (e.g. truncated) cache: drop it and rebuild from the CSV
+            print(f"Warning: discarding unreadable metadata cache {cache_path}: {e!r}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+    
+    objects = build_metadata()
+    
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to a private temp file and swap it in, so other workers only
+        # ever see a missing or a complete cache file
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=".metadata_", suffix=".tmp")
+        os.close(fd)
+        try:
+            os.chmod(tmp_path, 0o644)  # mkstemp creates it owner-only
+            joblib.dump(objects, tmp_path, compress=0, protocol=5)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        # Now that the new cache is in place, drop caches of older CSV versions
+        for name in os.listdir(CACHE_DIR):
+            path = os.path.join(CACHE_DIR, name)
+            if name.startswith("metadata_") and name.endswith(".joblib") and path != cache_path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # Already removed by another worker
+    except OSError as e:
+        print(f"Warning: could not write metadata cache: {e}")
+    
+    return objects
+
+def build_metadata():
+    """Load and index metadata."""
+    objects = {}
+    
+    # Multi-threaded Arrow parse straight into Arrow-backed string columns
+    table = pa_csv.read_csv(
+        METADATA_PATH,
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=['ID', 'Title_Romaji', 'Title_English', 'Genres'],
+            strings_can_be_null=True,
+        ),
+    )
+    meta_df = table.to_pandas(types_mapper=pd.ArrowDtype)
     
     # Use English title if available, otherwise fall back to Romaji (Japanese)
-    meta_df['title'] = meta_df['Title_English'].fillna(meta_df['Title_Romaji'])
+    meta_df['title'] = meta_df['Title_English'].fillna(meta_df['Title_Romaji']).fillna('')
     meta_df['title_japanese'] = meta_df['Title_Romaji']
     
     meta_df = meta_df.rename(columns={
@@ -40,53 +118,123 @@ def load_metadata():
     
     meta_df = meta_df.drop_duplicates(subset='id', keep='first')
     
-    # Store metadata with both English and Japanese titles accessible
-    objects['metadata'] = meta_df.set_index('id').to_dict(orient='index')
-    
-    # Create search index: prioritize English titles, then Japanese
-    objects['search_index_english'] = {}
-    objects['search_index_japanese'] = {}
-    
-    for uid, r in objects['metadata'].items():
-        # Get English title (may be NaN, so handle it)
-        english_title_raw = r.get('Title_English')
-        english_title = str(english_title_raw).lower().strip() if pd.notna(english_title_raw) else ''
-        
-        # Get Japanese title
-        japanese_title_raw = r.get('title_japanese')
-        japanese_title = str(japanese_title_raw).lower().strip() if pd.notna(japanese_title_raw) else ''
-        
-        # Add to search indices if valid
-        if english_title and english_title != 'nan' and english_title:
-            objects['search_index_english'][english_title] = uid
-        if japanese_title and japanese_title != 'nan' and japanese_title:
-            objects['search_index_japanese'][japanese_title] = uid
+    # Column store: anime ID -> row, plus one array per field indexed by row
+    ids = meta_df['id'].tolist()
+    objects['row_ids'] = ids
+    objects['id_to_row'] = dict(zip(ids, range(len(ids))))
+    objects['titles'] = meta_df['title'].to_numpy(dtype=object)
+    objects['genres'] = meta_df['genre'].fillna('Unknown').to_numpy(dtype=object)
+    
+    # Lower-cased and base titles (season/sequel markers stripped) used by the sequel filters
+    # (Python str.lower, as normalize_title and the baseline use; Arrow's lowercasing
+    # differs for some non-ASCII characters, e.g. final sigma)
+    objects['titles_lower'] = np.array([title.lower() for title in objects['titles']], dtype=object)
+    objects['base_titles'] = np.array(
+        [normalize_title(title) for title in objects['titles_lower']], dtype=object
+    )
+    # Base titles interned to int codes, for vectorized franchise dedup.
+    # An empty base title gets -1, the code recommend_batch uses for anime
+    # without metadata, so both fall in one group as they share ""
+    base_title_codes = pd.factorize(objects['base_titles'])[0].astype(np.int32)
+    base_title_codes[objects['base_titles'] == ''] = -1
+    objects['base_title_codes'] = base_title_codes
+    
+    # Create search index: prioritize English titles, then Japanese.
+    # Keys use Python str ops (object dtype), matching how search_anime lowercases the query
+    english_titles = meta_df['Title_English'].astype(object).str.lower().str.strip()
+    valid_english = english_titles.notna() & (english_titles != '') & (english_titles != 'nan')
+    objects['search_index_english'] = dict(zip(english_titles[valid_english], meta_df.loc[valid_english, 'id']))
+    
+    japanese_titles = meta_df['title_japanese'].astype(object).str.lower().str.strip()
+    valid_japanese = japanese_titles.notna() & (japanese_titles != '') & (japanese_titles != 'nan')
+    objects['search_index_japanese'] = dict(zip(japanese_titles[valid_japanese], meta_df.loc[valid_japanese, 'id']))
     
     print("Metadata loaded with English and Japanese search indices")
     return objects
 
-def initialize_all():
-    """Load all assets on startup."""
-    print("Server startup")
-    
-    # Load SVD model
-    objects = load_svd_model()
-    
-    # Load metadata
-    metadata_objects = load_metadata()
-    objects.update(metadata_objects)
-    
-    # Build TF-IDF index
-    vectorizer, tfidf_matrix, anime_ids = build_tfidf_index(objects['metadata'])
-    objects['tfidf_vectorizer'] = vectorizer
-    objects['tfidf_matrix'] = tfidf_matrix
-    objects['tfidf_anime_ids'] = anime_ids
-    
-    # Validate required keys
-    required_keys = ['model', 'anime_id_to_idx', 'idx_to_anime_id', 'metadata']
-    for key in required_keys:
-        if key not in objects:
-            raise ValueError(f"Failed to load required data: {key}")
-    
-    print("-----All assets loaded successfully-----")
-    return objects
\ No newline at end of file
+def build_search_indices(metadata):
+    """Build suffix arrays for substring search over both title indices."""
+    objects = {
+        'substring_index_english': build_substring_index(metadata['search_index_english']),
+        'substring_index_japanese': build_substring_index(metadata['search_index_japanese']),
+    }
+    print("Substring search indices built")
+    return objects
+
+def build_tfidf(metadata):
+    """Build the TF-IDF index used by content-based filtering."""
+    genre_vocabulary, tfidf_matrix, anime_ids, anime_id_to_idx = build_tfidf_index(metadata['row_ids'], metadata['genres'])
+    return {
+        'tfidf_vocabulary': genre_vocabulary,
+        'tfidf_matrix': tfidf_matrix,
+        'tfidf_anime_ids': anime_ids,
+        'tfidf_id_to_idx': anime_id_to_idx,
+    }
+
+class Registry:
+    """
+    Server assets, each group loaded on first use.
+    Supports the same key access as a plain dict so services can keep
+    using objects['...']; only the groups a request touches get loaded.
+    """
+    # Asset key -> the group (cached property) that provides it
+    SOURCES = {
+        'anime_id_to_idx': 'svd',
+        'idx_to_anime_id': 'svd',
+        'item_vectors_unit': 'svd',
+        'row_ids': 'metadata',
+        'id_to_row': 'metadata',
+        'titles': 'metadata',
+        'titles_lower': 'metadata',
+        'genres': 'metadata',
+        'base_titles': 'metadata',
+        'base_title_codes': 'metadata',
+        'search_index_english': 'metadata',
+        'search_index_japanese': 'metadata',
+        'substring_index_english': 'search',
+        'substring_index_japanese': 'search',
+        'tfidf_vocabulary': 'tfidf',
+        'tfidf_matrix': 'tfidf',
+        'tfidf_anime_ids': 'tfidf',
+        'tfidf_id_to_idx': 'tfidf',
+    }
+    
+    def __init__(self):
+        # Serializes first loads so concurrent requests don't build a group twice
+        self._lock = threading.RLock()
+    
+    @cached_property
+    def svd(self):
+        return load_svd_model()
+    
+    @cached_property
+    def metadata(self):
+        return load_metadata()
+    
+    @cached_property
+    def search(self):
+        return build_search_indices(self._load('metadata'))
+    
+    @cached_property
+    def tfidf(self):
+        return build_tfidf(self._load('metadata'))
+    
+    def warm(self, *groups):
+        """Load the given groups now instead of on first use."""
+        for group in groups:
+            self._load(group)
+    
+    def _load(self, group):
+        if group in self.__dict__:
+            return self.__dict__[group]
+        with self._lock:
+            return getattr(self, group)
+    
+    def __getitem__(self, key):
+        return self._load(self.SOURCES[key])[key]
+    
+    def __contains__(self, key):
+        return key in self.SOURCES and key in self._load(self.SOURCES[key])
+    
+    def get(self, key, default=None):
+        return self[key] if key in self else default
@@ -1,11 +1,32 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from data_loader import initialize_all
-from services.recommendation_service import recommend_hybrid, recommend_batch
+from fastapi.responses import ORJSONResponse
+from data_loader import Registry
+from services.recommendation_service import recommend_hybrid, recommend_batch, clear_recommendation_cache
 from services.search_service import search_anime
 from typing import List
 
-app = FastAPI(title="Anime Recommender API")
+# Global state
+objects = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global objects
+    objects = Registry()
+    clear_recommendation_cache()
+    
+    # Warm the common assets on a worker thread so the server starts accepting
+    # requests (e.g. / health checks) right away; a request that needs an asset
+    # before it's ready just waits for that load. TF-IDF stays lazy.
+    warmup = asyncio.create_task(asyncio.to_thread(objects.warm, 'svd', 'metadata', 'search'))
+    yield
+    # Failures are left for the first request that needs the asset to report
+    await asyncio.gather(warmup, return_exceptions=True)
+
+# orjson serializes the small result lists several times faster than stdlib json
+app = FastAPI(title="Anime Recommender API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -16,14 +37,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global state
-objects = {}
-
-@app.on_event("startup")
-def load_assets():
-    global objects
-    objects = initialize_all()
-
 @app.get('/')
 def home():
     return {"status": "alive"}
@@ -0,0 +1,31 @@
+import joblib
+import os
+from config import MODEL_PATH
+from utils.ranking import unit_rows
+
+# Re-dump an existing model file uncompressed with pickle protocol 5.
+# joblib then writes every ndarray as a raw, aligned buffer, so the server's
+# joblib.load(..., mmap_mode='r') maps the item vectors straight from the file
+# instead of copying it into freshly allocated arrays.
+# Files from older versions are also slimmed down to what the server reads:
+# the SVD estimator (or raw item vectors) becomes unit-length item vectors
+# and the ratings matrix is dropped.
+
+if not os.path.exists(MODEL_PATH):
+    print(f"Error: Model not found at {MODEL_PATH}")
+    exit()
+
+print(f"Loading {MODEL_PATH}...")
+model_data = joblib.load(MODEL_PATH)
+
+if 'model' in model_data:
+    model_data['item_vectors_unit'] = unit_rows(model_data.pop('model').components_.T)
+if 'item_vectors' in model_data:
+    model_data['item_vectors_unit'] = unit_rows(model_data.pop('item_vectors'))
+model_data.pop('matrix', None)
+
+# Write next to the original and swap, so a failed dump never leaves a broken model
+tmp_path = MODEL_PATH + ".tmp"
+joblib.dump(model_data, tmp_path, compress=0, protocol=5)
+os.replace(tmp_path, MODEL_PATH)
+print(f"SUCCESS! Model repacked at {MODEL_PATH}")
@@ -1,32 +1,45 @@
 from fastapi import HTTPException
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity as tfidf_cosine_similarity
-from utils.title_normalizer import normalize_title
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfTransformer
+from utils.ranking import top_k_indices, first_per_group
+from utils.result_cache import AnimeResultCache
 
-def build_tfidf_index(metadata):
+def build_tfidf_index(row_ids, genres):
     """
     Build TF-IDF vectors for all anime genres.
-    Returns: (vectorizer, tfidf_matrix, anime_ids)
+    Returns: (genre_vocabulary, tfidf_matrix, anime_ids, anime_id_to_idx)
     """
-    anime_genres = []
     anime_ids = []
+    genre_vocabulary = {}
+    rows = []
+    cols = []
     
-    for anime_id, meta in metadata.items():
-        genre_str = str(meta.get('genre', 'Unknown')).lower()
+    # There are only a few dozen genres, so count them straight into a sparse
+    # matrix instead of running every document through a text vectorizer
+    for i, (anime_id, genre) in enumerate(zip(row_ids, genres)):
+        genre_str = str(genre).lower()
         genre_str = genre_str.replace('[', '').replace(']', '').replace("'", "")
-        anime_genres.append(genre_str)
+        for g in genre_str.split(','):
+            rows.append(i)
+            cols.append(genre_vocabulary.setdefault(g.strip(), len(genre_vocabulary)))
         anime_ids.append(anime_id)
     
-    vectorizer = TfidfVectorizer(
-        tokenizer=lambda x: [g.strip() for g in x.split(',')],
-        lowercase=True,
-        token_pattern=None  # We're doing custom tokenization
+    # Duplicate (row, col) pairs are summed, giving raw term counts
+    genre_counts = csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(anime_ids), len(genre_vocabulary))
     )
     
-    tfidf_matrix = vectorizer.fit_transform(anime_genres)
+    # Unit rows: similarity is a dot product
+    tfidf_matrix = TfidfTransformer(norm='l2').fit_transform(genre_counts).astype(np.float32)
+    tfidf_matrix.indices = tfidf_matrix.indices.astype(np.int32)
+    tfidf_matrix.indptr = tfidf_matrix.indptr.astype(np.int32)
+    
+    anime_id_to_idx = {anime_id: i for i, anime_id in enumerate(anime_ids)}
     
     print(f"TF-IDF index built for {len(anime_ids)} animes")
-    return vectorizer, tfidf_matrix, anime_ids
+    return genre_vocabulary, tfidf_matrix, anime_ids, anime_id_to_idx
 
 def recommend_content_based(anime_id: int, objects: dict, limit: int = 10):
     """
@@ -36,76 +49,89 @@ def recommend_content_based(anime_id: int, objects: dict, limit: int = 10):
     if 'tfidf_matrix' not in objects:
         raise HTTPException(status_code=503, detail="TF-IDF index not loaded")
 
-    input_meta = objects['metadata'].get(anime_id, {})
-    if not input_meta:
+    if anime_id not in objects['id_to_row']:
         raise HTTPException(status_code=404, detail="Anime not found in metadata")
     
-    input_title = input_meta.get('title', "").lower()
-    input_base_title = normalize_title(input_title)
+    if anime_id not in objects['tfidf_id_to_idx']:
+        raise HTTPException(status_code=404, detail="Anime not found in TF-IDF index")
+    
+    recommendations = _content_based_cache.get(anime_id, objects)
+    
+    return {
+        # Fresh dicts per response: the cached records are shared by every request
+        "recommendations": [
+            {"id": rec_id, "title": title, "genre": genre, "score": score, "img_url": None}
+            for rec_id, title, genre, score in recommendations[:limit]
+        ],
+        "method": "content_based",
+        "message": "Using Content-Based Filtering (TF-IDF)"
+    }
+
+def _content_based_candidates(anime_id: int, objects):
+    """
+    Filtered, deduplicated TF-IDF recommendations for one anime, best first.
+    Records are (id, title, genre, score) tuples, cached per anime by the caller.
+    """
+    # Local references: the loop below runs for every candidate
+    id_to_row = objects['id_to_row']
+    tfidf_anime_ids = objects['tfidf_anime_ids']
+    titles = objects['titles']
+    titles_lower = objects['titles_lower']
+    genres = objects['genres']
+    base_titles = objects['base_titles']
+    
+    input_row = id_to_row[anime_id]
+    input_title = titles_lower[input_row]
+    input_base_title = base_titles[input_row]
     
     # Find the index of this anime in TF-IDF matrix
-    try:
-        anime_idx = objects['tfidf_anime_ids'].index(anime_id)
-    except ValueError:
-        raise HTTPException(status_code=404, detail="Anime not found in TF-IDF index")
+    anime_idx = objects['tfidf_id_to_idx'][anime_id]
     
     # Get the TF-IDF vector for this anime
-    anime_vector = objects['tfidf_matrix'][anime_idx:anime_idx+1]
+    tfidf_matrix = objects['tfidf_matrix']
+    anime_vector = tfidf_matrix[anime_idx:anime_idx+1]
     
-    # Calculate similarity with all other anime
-    similarities = tfidf_cosine_similarity(anime_vector, objects['tfidf_matrix']).flatten()
+    # Calculate similarity with all other anime: rows are already L2-normalized,
+    # so cosine similarity is a plain sparse matrix product
+    similarities = (tfidf_matrix @ anime_vector.T).toarray().ravel()
     
     # Get top candidates
-    top_indices = similarities.argsort()[::-1][:50]
+    top_indices = top_k_indices(similarities, 50)
     
-    recommendations = []
-    seen_base_titles = {}
+    candidates = []
     
-    for i in top_indices:
-        rec_id = objects['tfidf_anime_ids'][i]
+    for i in top_indices.tolist():
+        rec_id = tfidf_anime_ids[i]
         
         # Skip the input anime itself
         if rec_id == anime_id:
             continue
         
-        meta = objects['metadata'].get(rec_id, {})
-        rec_title = meta.get('title', "").lower()
-        rec_base_title = normalize_title(rec_title)
-        
-        # Filter sequels of input anime
-        if (input_title in rec_title or rec_title in input_title or 
-            input_base_title == rec_base_title):
+        row = id_to_row.get(rec_id)
+        if row is None:
             continue
         
-        # Deduplicate other franchises' seasons
-        score = float(similarities[i])
+        # Filter sequels of input anime (same franchise first, it's the cheap check)
+        if base_titles[row] == input_base_title:
+            continue
         
-        if rec_base_title in seen_base_titles:
-            if score > seen_base_titles[rec_base_title][0]:
-                seen_base_titles[rec_base_title] = (score, {
-                    "id": int(rec_id),
-                    "title": meta.get('title', f"Anime #{rec_id}"),
-                    "genre": meta.get('genre', 'Unknown'),
-                    "score": score,
-                    "img_url": None
-                })
+        rec_title = titles_lower[row]
+        if input_title in rec_title or rec_title in input_title:
             continue
-        else:
-            rec_data = {
-                "id": int(rec_id),
-                "title": meta.get('title', f"Anime #{rec_id}"),
-                "genre": meta.get('genre', 'Unknown'),
-                "score": score,
-                "img_url": None
-            }
-            seen_base_titles[rec_base_title] = (score, rec_data)
-    
-    # Convert to list and sort by score
-    recommendations = [rec for _, rec in seen_base_titles.values()]
-    recommendations.sort(key=lambda x: x['score'], reverse=True)
+        
+        candidates.append((i, rec_id, row))
     
-    return {
-        "recommendations": recommendations[:limit],
-        "method": "content_based",
-        "message": "Using Content-Based Filtering (TF-IDF)"
-    }
\ No newline at end of file
+    # Deduplicate other franchises' seasons, keeping the best-scored entry of each
+    codes = objects['base_title_codes'][[row for _, _, row in candidates]]
+    # Immutable records: cached entries are shared, so callers can't alter them
+    return tuple(
+        (int(rec_id), titles[row], genres[row], float(similarities[i]))
+        for i, rec_id, row in (candidates[j] for j in first_per_group(codes))
+    )
+
+# Filtered candidates only change when assets are reloaded
+_content_based_cache = AnimeResultCache(_content_based_candidates)
+
+def clear_content_based_cache():
+    """Drop cached content-based recommendations, e.g. after a reload."""
+    _content_based_cache.clear()
\ No newline at end of file
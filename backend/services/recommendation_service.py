@@ -1,10 +1,10 @@
 from fastapi import HTTPException
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 from typing import List
-from collections import defaultdict
 
-from utils.title_normalizer import normalize_title
-from services.content_based_service import recommend_content_based
+from utils.ranking import top_k_indices, first_per_group
+from utils.result_cache import AnimeResultCache
+from services.content_based_service import recommend_content_based, clear_content_based_cache
 
 def recommend_collaborative(anime_id: int, objects: dict, limit: int = 10):
     """
@@ -16,70 +16,87 @@ def recommend_collaborative(anime_id: int, objects: dict, limit: int = 10):
     if anime_id not in objects.get("anime_id_to_idx", {}):
         raise HTTPException(status_code=404, detail="Anime ID not found in SVD model")
     
+    recommendations = _collaborative_cache.get(anime_id, objects)
+    
+    return {
+        # Fresh dicts per response: the cached records are shared by every request
+        "recommendations": [
+            {"id": rec_id, "title": title, "genre": genre, "score": score, "img_url": None}
+            for rec_id, title, genre, score in recommendations[:limit]
+        ],
+        "method": "collaborative",
+        "message": "Using Collaborative Filtering (SVD)"
+    }
+
+def _collaborative_candidates(anime_id: int, objects):
+    """
+    Filtered, deduplicated SVD recommendations for one anime, best first.
+    Records are (id, title, genre, score) tuples, cached per anime by the caller.
+    """
+    # Local references: the loop below runs for every candidate
+    id_to_row = objects['id_to_row']
+    idx_to_anime_id = objects['idx_to_anime_id']
+    titles = objects['titles']
+    titles_lower = objects['titles_lower']
+    genres = objects['genres']
+    base_titles = objects['base_titles']
+    base_title_codes = objects['base_title_codes']
+    item_vectors_unit = objects['item_vectors_unit']
+    
     # 1. Get the Input Title (so we can filter sequels)
-    input_meta = objects['metadata'].get(anime_id, {})
-    input_title = input_meta.get('title', "").lower()
-    input_base_title = normalize_title(input_title)
+    input_row = id_to_row.get(anime_id)
+    input_title = titles_lower[input_row] if input_row is not None else ""
+    input_base_title = base_titles[input_row] if input_row is not None else ""
     
     # 2. Get Vector & Similarity Scores
     idx = objects['anime_id_to_idx'][anime_id]
-    target_vector = objects['item_vectors'][idx].reshape(1, -1)
-    scores = cosine_similarity(target_vector, objects['item_vectors']).flatten()
+    scores = item_vectors_unit @ item_vectors_unit[idx]
     
     # 3. Get Top 50 candidates (We fetch more so we can throw away sequels)
-    top_indices = scores.argsort()[::-1][:50]
+    top_indices = top_k_indices(scores, 50)
     
-    recommendations = []
-    seen_base_titles = {}
+    candidates = []
     
-    for i in top_indices:
-        rec_id = objects['idx_to_anime_id'][i]
+    for i in top_indices.tolist():
+        rec_id = idx_to_anime_id[i]
         
         # Skip the input anime itself
         if rec_id == anime_id:
             continue
             
-        meta = objects['metadata'].get(rec_id, {})
-        rec_title = meta.get('title', "").lower()
-        rec_base_title = normalize_title(rec_title)
+        row = id_to_row.get(rec_id)
         
-        # --- FILTER 1: Skip sequels of the INPUT anime ---
-        if (input_title in rec_title or rec_title in input_title or 
-            input_base_title == rec_base_title):
+        # No metadata: an empty title is contained in every title, so skip it
+        if row is None:
             continue
         
-        # --- FILTER 2: Deduplicate other franchises' seasons ---
-        score = float(scores[i])
+        # --- FILTER 1: Skip sequels of the INPUT anime ---
+        # Same franchise is the common case; check it before the substring scans
+        if base_titles[row] == input_base_title:
+            continue
         
-        if rec_base_title in seen_base_titles:
-            if score > seen_base_titles[rec_base_title][0]:
-                seen_base_titles[rec_base_title] = (score, {
-                    "id": int(rec_id),
-                    "title": meta.get('title', f"Anime #{rec_id}"),
-                    "genre": meta.get('genre', 'Unknown'),
-                    "score": score,
-                    "img_url": None
-                })
+        rec_title = titles_lower[row]
+        if input_title in rec_title or rec_title in input_title:
             continue
-        else:
-            rec_data = {
-                "id": int(rec_id),
-                "title": meta.get('title', f"Anime #{rec_id}"),
-                "genre": meta.get('genre', 'Unknown'),
-                "score": score,
-                "img_url": None
-            }
-            seen_base_titles[rec_base_title] = (score, rec_data)
-    
-    # Convert to list and sort by score
-    recommendations = [rec for _, rec in seen_base_titles.values()]
-    recommendations.sort(key=lambda x: x['score'], reverse=True)
-    
-    return {
-        "recommendations": recommendations[:limit],
-        "method": "collaborative",
-        "message": "Using Collaborative Filtering (SVD)"
-    }
+        
+        candidates.append((i, rec_id, row))
+    
+    # --- FILTER 2: Deduplicate other franchises' seasons ---
+    # Candidates are best-first, so keeping the first of each base title keeps the best
+    codes = base_title_codes[[row for _, _, row in candidates]]
+    # Immutable records: cached entries are shared, so callers can't alter them
+    return tuple(
+        (int(rec_id), titles[row], genres[row], float(scores[i]))
+        for i, rec_id, row in (candidates[j] for j in first_per_group(codes))
+    )
+
+# Filtered candidates only change when assets are reloaded
+_collaborative_cache = AnimeResultCache(_collaborative_candidates)
+
+def clear_recommendation_cache():
+    """Drop cached recommendations, e.g. after the model is reloaded."""
+    _collaborative_cache.clear()
+    clear_content_based_cache()
 
 def recommend_hybrid(anime_id: int, objects: dict, limit: int = 10):
     """
@@ -103,89 +120,76 @@ def recommend_batch(anime_ids: List[int], objects: dict, limit: int = 20):
     if 'anime_id_to_idx' not in objects:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
+    # Local references: the loops below run for every input and candidate
+    id_to_row = objects['id_to_row']
+    anime_id_to_idx = objects['anime_id_to_idx']
+    idx_to_anime_id = objects['idx_to_anime_id']
+    titles = objects['titles']
+    genres = objects['genres']
+    base_titles = objects['base_titles']
+    base_title_codes = objects['base_title_codes']
+    
     # Track which animes are in the input list (to exclude them)
     input_anime_ids = set(anime_ids)
-    input_base_titles = set()
+    input_rows = [id_to_row[anime_id] for anime_id in anime_ids if anime_id in id_to_row]
     
     # Get base titles of input animes (to filter sequels)
-    for anime_id in anime_ids:
-        if anime_id in objects.get("metadata", {}):
-            meta = objects['metadata'][anime_id]
-            title = meta.get('title', "").lower()
-            input_base_titles.add(normalize_title(title))
+    input_base_titles = {base_titles[row] for row in input_rows}
     
     # Aggregate scores from all input animes
-    aggregated_scores = defaultdict(float)
-    valid_count = 0
+    target_idxs = [anime_id_to_idx[anime_id] for anime_id in anime_ids if anime_id in anime_id_to_idx]
     
-    for anime_id in anime_ids:
-        if anime_id not in objects.get("anime_id_to_idx", {}):
-            continue  # Skip if not in model
-        
-        valid_count += 1
-        idx = objects['anime_id_to_idx'][anime_id]
-        target_vector = objects['item_vectors'][idx].reshape(1, -1)
-        scores = cosine_similarity(target_vector, objects['item_vectors']).flatten()
-        
-        # Add scores to aggregated dict (weighted equally)
-        for i, score in enumerate(scores):
-            rec_id = objects['idx_to_anime_id'][i]
-            if rec_id not in input_anime_ids:  # Don't recommend what they already have
-                aggregated_scores[rec_id] += float(score)
-    
-    if valid_count == 0:
+    if not target_idxs:
         raise HTTPException(status_code=404, detail="None of the provided anime IDs found in model")
     
-    # Average the scores
-    for rec_id in aggregated_scores:
-        aggregated_scores[rec_id] /= valid_count
+    # Averaging the per-input cosine scores (weighted equally) equals scoring
+    # against the mean input vector, so one GEMV replaces the (K x n) GEMM
+    item_vectors_unit = objects['item_vectors_unit']
+    scores = item_vectors_unit @ item_vectors_unit[target_idxs].mean(axis=0)
+    
+    # Don't recommend what they already have
+    scores[target_idxs] = -np.inf
     
     # Get top candidates
-    sorted_recs = sorted(aggregated_scores.items(), key=lambda x: x[1], reverse=True)[:100]
+    top_indices = top_k_indices(scores, 100)
     
-    # Filter and deduplicate
-    recommendations = []
-    seen_base_titles = {}
+    # Filter sequels of input animes
+    candidates = []
     
-    for rec_id, score in sorted_recs:
-        meta = objects['metadata'].get(rec_id, {})
-        rec_title = meta.get('title', "").lower()
-        rec_base_title = normalize_title(rec_title)
+    for i in top_indices.tolist():
+        rec_id = idx_to_anime_id[i]
+        if rec_id in input_anime_ids:
+            continue
+        
+        row = id_to_row.get(rec_id)
+        rec_base_title = base_titles[row] if row is not None else ""
         
         # Skip sequels of input animes
         if rec_base_title in input_base_titles:
             continue
         
-        # Deduplicate franchises
-        if rec_base_title in seen_base_titles:
-            if score > seen_base_titles[rec_base_title][0]:
-                seen_base_titles[rec_base_title] = (score, {
-                    "id": int(rec_id),
-                    "title": meta.get('title', f"Anime #{rec_id}"),
-                    "genre": meta.get('genre', 'Unknown'),
-                    "score": score,
-                    "img_url": None
-                })
-            continue
-        else:
-            rec_data = {
-                "id": int(rec_id),
-                "title": meta.get('title', f"Anime #{rec_id}"),
-                "genre": meta.get('genre', 'Unknown'),
-                "score": score,
-                "img_url": None
-            }
-            seen_base_titles[rec_base_title] = (score, rec_data)
-    
-    # Convert to list and sort
-    recommendations = [rec for _, rec in seen_base_titles.values()]
-    recommendations.sort(key=lambda x: x['score'], reverse=True)
+        candidates.append((i, rec_id, row))
+    
+    # Deduplicate franchises, keeping the best-scored entry of each
+    # (anime without metadata use -1, the code of an empty base title, so they
+    # group together with titles that normalize to "")
+    codes = np.array(
+        [base_title_codes[row] if row is not None else -1 for _, _, row in candidates],
+        dtype=np.int64
+    )
+    recommendations = [
+        {
+            "id": int(rec_id),
+            "title": titles[row] if row is not None else f"Anime #{rec_id}",
+            "genre": genres[row] if row is not None else 'Unknown',
+            "score": float(scores[i]),
+            "img_url": None
+        }
+        for i, rec_id, row in (candidates[j] for j in first_per_group(codes))
+    ]
     
     # Get input anime titles for the message
-    input_titles = []
-    for anime_id in anime_ids:
-        if anime_id in objects.get("metadata", {}):
-            input_titles.append(objects['metadata'][anime_id].get('title', f"Anime #{anime_id}"))
+    input_titles = [titles[row] for row in input_rows]
     
     return {
         "recommendations": recommendations[:limit],
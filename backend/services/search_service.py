@@ -1,92 +1,142 @@
+from bisect import bisect_left, bisect_right
+from array import array
+from itertools import chain, islice
+import numpy as np
+
+# Separates titles in the suffix array text; sorts before every other byte
+_TITLE_SEP = b'\x00'
+
+def build_substring_index(title_index):
+    """
+    Build a suffix array over all titles of a search index so substring
+    lookups are two binary searches instead of a scan over every title.
+    Titles are packed into one contiguous UTF-8 buffer, so the text stays at
+    one byte per ASCII character even when a few titles need wider code points.
+    Titles are also kept sorted on their own, so the "starts with" tier only
+    touches titles beginning with the query rather than every occurrence.
+    Returns: (text, suffixes, owners, uids, sorted_titles, sorted_ranks)
+    """
+    encoded = [title.encode('utf-8').replace(_TITLE_SEP, b'') for title in title_index]
+    uids = list(title_index.values())
+    text = _TITLE_SEP.join(encoded) + _TITLE_SEP
+    
+    # Sort suffix start positions by prefix doubling on integer ranks, rather
+    # than materializing a bytes copy of every suffix
+    data = np.frombuffer(text, dtype=np.uint8)
+    is_sep = data == 0
+    order = _suffix_order(data, is_sep)
+    
+    # Keep suffixes that start a character (UTF-8 continuation bytes are
+    # 0b10xxxxxx) inside a title; the owner is the number of separators before it
+    keep = ((data[order] & 0xC0) != 0x80) & ~is_sep[order]
+    order = order[keep]
+    title_of = np.cumsum(is_sep, dtype=np.int32) - is_sep
+    
+    suffixes = array('i', order.astype(np.int32).tobytes())
+    owners = array('i', title_of[order].tobytes())
+    
+    titles_by_bytes = sorted(zip(encoded, range(len(encoded))))
+    sorted_titles = [title for title, _ in titles_by_bytes]
+    sorted_ranks = array('i', [rank for _, rank in titles_by_bytes])
+    return text, suffixes, owners, uids, sorted_titles, sorted_ranks
+
+def _suffix_order(data, is_sep):
+    """
+    Start positions of all suffixes of data in sorted order.
+    Each separator gets its own rank, below every byte and increasing with
+    position, so comparisons stop at the end of a title and equal title
+    suffixes are ordered by position. Doubling then only has to run until
+    the longest repeat inside a title is resolved.
+    """
+    n = len(data)
+    n_sep = int(is_sep.sum())
+    rank = data.astype(np.int64) + n_sep
+    rank[is_sep] = np.arange(n_sep)
+    rank = np.unique(rank, return_inverse=True)[1].astype(np.int64)  # dense, < n
+    
+    span = 1
+    while True:
+        # (rank, rank span bytes later) packed into one int64 sort key;
+        # ranks are < n, and positions past the end count as -1
+        pair = rank * (n + 1)
+        pair[:n - span] += rank[span:] + 1
+        order = np.argsort(pair)
+        
+        sorted_pair = pair[order]
+        rank = np.empty(n, dtype=np.int64)
+        rank[order[0]] = 0
+        rank[order[1:]] = np.cumsum(sorted_pair[1:] != sorted_pair[:-1])
+        
+        # Every suffix has a distinct rank: the order is final
+        if rank[order[-1]] == n - 1:
+            return order
+        span *= 2
+
+def iter_title_matches(query, title_index, substring_index):
+    """
+    Yield IDs of titles containing the query, best tier first:
+    exact match, then titles starting with the query, then other substring
+    matches (each tier in index order). Later tiers are only computed if the
+    caller keeps iterating. IDs may repeat across tiers.
+    """
+    exact_uid = title_index.get(query)
+    if exact_uid is not None:
+        yield exact_uid
+    
+    query_bytes = query.encode('utf-8')
+    if substring_index is None or _TITLE_SEP in query_bytes:
+        return
+    
+    text, suffixes, owners, uids, sorted_titles, sorted_ranks = substring_index
+    size = len(query_bytes)
+    
+    # Titles starting with the query are one contiguous run of the sorted titles
+    key = lambda title: title[:size]
+    lo = bisect_left(sorted_titles, query_bytes, key=key)
+    hi = bisect_right(sorted_titles, query_bytes, lo=lo, key=key)
+    prefix_ranks = sorted(sorted_ranks[lo:hi])
+    for rank in prefix_ranks:
+        yield uids[rank]
+    
+    # Titles never contain the separator, so comparing each suffix on its first
+    # len(query_bytes) bytes keeps the array sorted with respect to the query
+    key = lambda pos: text[pos:pos + size]
+    lo = bisect_left(suffixes, query_bytes, key=key)
+    hi = bisect_right(suffixes, query_bytes, lo=lo, key=key)
+    
+    for rank in sorted(set(owners[lo:hi]).difference(prefix_ranks)):
+        yield uids[rank]
+
 def search_anime(query: str, objects: dict, limit: int = 5):
     """Search anime by English/Japanese title."""
     query = query.lower().strip()
     if not query:
         return {"results": []}
     
-    results = []
-    seen_ids = set()
-    
-    # Step 1: Search English titles first (priority)
-    exact_matches = []
-    partial_matches = []
-    
-    for title, uid in objects.get('search_index_english', {}).items():
-        if uid in seen_ids:
-            continue
-        if title == query:
-            exact_matches.append((title, uid))
-        elif query in title:
-            partial_matches.append((title, uid))
+    # English titles first (priority), then Japanese; consumed lazily so
+    # lower tiers are never computed once the limit is reached
+    candidates = chain(
+        iter_title_matches(
+            query,
+            objects.get('search_index_english', {}),
+            objects.get('substring_index_english'),
+        ),
+        iter_title_matches(
+            query,
+            objects.get('search_index_japanese', {}),
+            objects.get('substring_index_japanese'),
+        ),
+    )
     
-    # Add exact matches first
-    for title, uid in exact_matches:
-        meta = objects['metadata'][uid]
-        if meta:
-            results.append({
-                "id": uid,
-                "title": meta['title'],
-                "img_url": None
-            })
-            seen_ids.add(uid)
-        if len(results) >= limit:
-            break
-    
-    # Then add partial matches
-    if len(results) < limit:
-        for title, uid in partial_matches:
-            if uid not in seen_ids:
-                meta = objects['metadata'][uid]
-                if meta:
-                    results.append({
-                        "id": uid,
-                        "title": meta['title'],
-                        "img_url": None
-                    })
-                    seen_ids.add(uid)
-                if len(results) >= limit:
-                    break
+    # Ordered, lazy dedup: an anime can match in several tiers or both languages
+    seen_ids = set()
+    unique_ids = (uid for uid in candidates if uid not in seen_ids and not seen_ids.add(uid))
     
-    # Step 2: If we don't have enough results, search Japanese titles
-    if len(results) < limit:
-        japanese_exact = []
-        japanese_partial = []
-        
-        for title, uid in objects.get('search_index_japanese', {}).items():
-            if uid in seen_ids:
-                continue
-            if title == query:
-                japanese_exact.append((title, uid))
-            elif query in title:
-                japanese_partial.append((title, uid))
-        
-        # Add exact Japanese matches
-        for title, uid in japanese_exact:
-            if uid not in seen_ids:
-                meta = objects['metadata'][uid]
-                if meta:
-                    results.append({
-                        "id": uid,
-                        "title": meta['title'],
-                        "img_url": None
-                    })
-                    seen_ids.add(uid)
-                if len(results) >= limit:
-                    break
-        
-        # Then partial Japanese matches
-        if len(results) < limit:
-            for title, uid in japanese_partial:
-                if uid not in seen_ids:
-                    meta = objects['metadata'][uid]
-                    if meta:
-                        results.append({
-                            "id": uid,
-                            "title": meta['title'],
-                            "img_url": None
-                        })
-                        seen_ids.add(uid)
-                    if len(results) >= limit:
-                        break
+    titles = objects['titles']
+    id_to_row = objects['id_to_row']
+    results = [
+        {"id": uid, "title": titles[id_to_row[uid]], "img_url": None}
+        for uid in islice(unique_ids, max(limit, 0))
+    ]
     
-    return {"results": results}
\ No newline at end of file
+    return {"results": results}
@@ -1,12 +1,15 @@
-import pandas as pd
 import numpy as np
-from scipy.sparse import csr_matrix
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from scipy.sparse import csr_matrix, save_npz
 from sklearn.decomposition import TruncatedSVD
 import joblib
 import os
+from utils.ranking import unit_rows
 
 DATA_PATH = '../data/clean_ratings.csv' 
 MODEL_PATH = '../models/svd_model.pkl'
+MATRIX_PATH = '../models/user_item_matrix.npz'
 
 #---Configiratuion and loading-----
 print("STEP 1: Loadinf Dataa-------")
@@ -17,14 +20,18 @@ if not os.path.exists(DATA_PATH):
 
 
 dtype_dict = {
-    'score': 'float32',   # Uses half the memory of standard numbers
-    'anime_id': 'int32'   # Sufficient for IDs up to 2 billion
+    'score': pa.float32(),   # Uses half the memory of standard numbers
+    'anime_id': pa.int32()   # Sufficient for IDs up to 2 billion
 }
 use_cols = ['username', 'anime_id', 'score']
 
 
 #this is loading the data
-df = pd.read_csv(DATA_PATH, dtype=dtype_dict,usecols=use_cols)
+# pyarrow parses the CSV in parallel blocks, pandas' reader is single-threaded
+df = pa_csv.read_csv(
+    DATA_PATH,
+    convert_options=pa_csv.ConvertOptions(include_columns=use_cols, column_types=dtype_dict)
+).to_pandas()
 print(f"Loaded {len(df):,} ratings successfully.")
 
 
@@ -45,9 +52,16 @@ print(f"Unique Animes: {df['anime_idx'].nunique():,}")
 
 print("\n--- STEP 3: CREATING SPARSE MATRIX ---")
 
+# Build the CSR arrays directly (rows grouped by user) instead of going through
+# COO -> CSR, which needs a second full copy of the ratings and a re-sort
+n_users = df['user_idx'].nunique()
+order = np.argsort(df['user_idx'].to_numpy(), kind='stable')
+user_idx = df['user_idx'].to_numpy()[order]
+indptr = np.searchsorted(user_idx, np.arange(n_users + 1))
+
 user_item_matrix = csr_matrix(
-    (df['score'], (df['user_idx'], df['anime_idx'])), 
-    shape=(df['user_idx'].nunique(), len(unique_anime_ids))
+    (df['score'].to_numpy()[order], df['anime_idx'].to_numpy(dtype=np.int32)[order], indptr),
+    shape=(n_users, len(unique_anime_ids))
 )
 print(f"Matrix Shape: {user_item_matrix.shape} (Users x Animes)")
 
@@ -63,15 +77,21 @@ print("Training Complete!")
 print(f"Explained Variance: {svd.explained_variance_ratio_.sum():.4f}") 
 
 print("\n--- STEP 5: SAVING THE BRAIN ---")
-# We save the model AND the ID mappings into one file.
+# We save the item vectors AND the ID mappings into one file.
 # The App needs the mappings to know that ID 55 = "Naruto"
+# (the App only needs one 50-number vector per anime, not the whole SVD object;
+# saved unit-length so it can score straight from the memory-mapped file)
 save_data = {
-    'model': svd,
-    'matrix': user_item_matrix,        # Optional: We might need this for 'Similar Users' later
+    'item_vectors_unit': unit_rows(svd.components_.T),
     'anime_id_to_idx': anime_id_to_idx,
     'idx_to_anime_id': idx_to_anime_id
 }
 
-joblib.dump(save_data, MODEL_PATH)
+# Uncompressed + protocol 5 so the server can memory-map the arrays
+joblib.dump(save_data, MODEL_PATH, compress=0, protocol=5)
 print(f"SUCCESS! Model saved to {MODEL_PATH}")
 
+# The ratings matrix goes in its own file so the server never has to load it.
+# Optional: We might need this for 'Similar Users' later
+save_npz(MATRIX_PATH, user_item_matrix)
+print(f"Ratings matrix saved to {MATRIX_PATH}")
@@ -0,0 +1,35 @@
+import numpy as np
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first.
+    Partitions in O(n) and only sorts the k survivors.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    
+    candidates = np.argpartition(scores, -k)[-k:]
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+def first_per_group(codes):
+    """
+    Positions of the first occurrence of each group code, in original order.
+    Used to keep the best entry per group from a best-first candidate list.
+    """
+    if len(codes) == 0:
+        return np.empty(0, dtype=np.intp)
+    
+    _, first = np.unique(codes, return_index=True)
+    first.sort()
+    return first
+
+def unit_rows(vectors):
+    """
+    Rows scaled to unit length, as a contiguous float32 array, so cosine
+    similarity is a single dot product. Kept float32: NumPy has no BLAS
+    kernel for int8/float16 matmul, so a quantized copy scores several
+    times slower than the sgemv.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype=np.float32)
\ No newline at end of file
@@ -0,0 +1,41 @@
+import threading
+from collections import OrderedDict
+
+class AnimeResultCache:
+    """
+    LRU cache of per-anime results, keyed on the anime ID alone.
+    Entries belong to the assets object they were computed from: calling with
+    a different one (e.g. after a reload) drops them all. Assets are expected
+    to be replaced, not mutated in place.
+    """
+    def __init__(self, compute, maxsize=4096):
+        self._compute = compute
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._objects = None
+        self._lock = threading.Lock()
+
+    def get(self, anime_id, objects):
+        with self._lock:
+            if objects is not self._objects:
+                self._entries.clear()
+                self._objects = objects
+            elif anime_id in self._entries:
+                self._entries.move_to_end(anime_id)
+                return self._entries[anime_id]
+
+        # Computed outside the lock so one slow miss doesn't block other requests
+        result = self._compute(anime_id, objects)
+
+        with self._lock:
+            # Skip storing if the assets were swapped while computing
+            if objects is self._objects:
+                self._entries[anime_id] = result
+                if len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._objects = None
@@ -1,36 +1,46 @@
 import re
+from functools import lru_cache
 
+# Applied in order: later patterns rely on earlier ones having already run
+_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'\s*season\s+\d+',           # "Season 2"
+    r'\s*\d+\s*season',           # "2 Season"
+    r'\s*\d+nd\s*season',         # "2nd Season"
+    r'\s*\d+rd\s*season',         # "3rd Season"
+    r'\s*\d+th\s*season',         # "4th Season"
+    r'\s*final\s*season',         # "Final Season"
+    r'\s*part\s+\d+',             # "Part 2"
+    r'\s*\d+$',                   # Trailing numbers "2", "3"
+    r'\s*:\s*the\s+final\s+season', # ": The Final Season"
+    # NEW: Handle sequel markers
+    r'\s*:\s*shippuden',          # ": Shippuden"
+    r'\s*:\s*brotherhood',        # ": Brotherhood"
+    r'\s*:\s*next\s+generations', # ": Next Generations"
+    r'\s*shippuden',              # "Shippuden" (standalone)
+    r'\s*brotherhood',            # "Brotherhood" (standalone)
+    r'\s*:\s*[^:]+$',            # ": Anything" at the end (catch-all for sequels)
+]]
+_WHITESPACE = re.compile(r'\s+')
+
+# Every pattern above needs one of these (or a trailing digit) to match.
+# Same flags as the patterns, so IGNORECASE equivalences (e.g. 'ı' for 'i') agree
+_MARKERS = re.compile(r'season|part|shippuden|brotherhood|:|\d\s*$', re.IGNORECASE)
+
+@lru_cache(maxsize=65536)
 def normalize_title(title):
     """Remove season indicators and sequel markers to get base title."""
     if not title:
         return ""
     
-    title_lower = title.lower()
-    patterns = [
-        r'\s*season\s+\d+',           # "Season 2"
-        r'\s*\d+\s*season',           # "2 Season"
-        r'\s*\d+nd\s*season',         # "2nd Season"
-        r'\s*\d+rd\s*season',         # "3rd Season"
-        r'\s*\d+th\s*season',         # "4th Season"
-        r'\s*final\s*season',         # "Final Season"
-        r'\s*part\s+\d+',             # "Part 2"
-        r'\s*\d+$',                   # Trailing numbers "2", "3"
-        r'\s*:\s*the\s+final\s+season', # ": The Final Season"
-        # NEW: Handle sequel markers
-        r'\s*:\s*shippuden',          # ": Shippuden"
-        r'\s*:\s*brotherhood',        # ": Brotherhood"
-        r'\s*:\s*next\s+generations', # ": Next Generations"
-        r'\s*shippuden',              # "Shippuden" (standalone)
-        r'\s*brotherhood',            # "Brotherhood" (standalone)
-        r'\s*:\s*[^:]+$',            # ": Anything" at the end (catch-all for sequels)
-    ]
+    normalized = title.lower()
     
-    normalized = title_lower
-    for pattern in patterns:
-        normalized = re.sub(pattern, '', normalized, flags=re.IGNORECASE)
+    # Fast path: most titles carry no sequel marker, so skip the regex chain
+    if _MARKERS.search(normalized):
+        for pattern in _PATTERNS:
+            normalized = pattern.sub('', normalized)
     
     # Remove colons and extra spaces
     normalized = normalized.replace(':', '')
-    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    normalized = _WHITESPACE.sub(' ', normalized).strip()
     
-    return normalized
\ No newline at end of file
+    return normalized